@@ -1,160 +1,849 @@
+import asyncio
+import collections
+import functools
+import hashlib
 import json
 import requests
-import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from openai import OpenAI
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import tkinter as tk
 from tkinter import ttk, messagebox
 import webbrowser
+from array import array
 import logging
+import math
+import operator
+import re
+import threading
 import time
-from typing import List, Dict
-import facebook_scraper as fb
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple, TypedDict
+
+# Heavy third-party modules are imported inside the functions that use them, so the window opens quickly
+if TYPE_CHECKING:
+    import diskcache
+    import tiktoken
+    from openai import AsyncOpenAI
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load configuration from config.json
-try:
-    with open('config.json', 'r') as config_file:
-        CONFIG = json.load(config_file)
-    HUNTER_KEY = CONFIG['hunter_key']
-    OPENAI_KEY = CONFIG['openai_key']
-    GOOGLE_CREDS = CONFIG['google_creds']
-except FileNotFoundError:
-    logging.error("config.json not found. Please create it with your API keys.")
-    raise
-except KeyError as e:
-    logging.error(f"Missing key in config.json: {str(e)}")
-    raise
+class _RequiredConfig(TypedDict):
+    hunter_key: str
+    openai_key: str
+    google_creds: dict
+
+class ConfigDict(_RequiredConfig, total=False):
+    """Shape of config.json."""
+    score_model: str
+
+@functools.lru_cache(maxsize=1)
+def _cfg() -> ConfigDict:
+    """Load and validate config.json on first use, so it is only read when an API needs it."""
+    try:
+        with open('config.json', 'r') as config_file:
+            config = json.load(config_file)
+        for key in ConfigDict.__required_keys__:
+            if key not in config:
+                raise KeyError(key)
+        return config
+    except FileNotFoundError:
+        logging.error("config.json not found. Please create it with your API keys.")
+        raise
+    except KeyError as e:
+        logging.error("Missing key in config.json: %s", e)
+        raise
+
+@functools.lru_cache(maxsize=None)
+def _cache(directory: str) -> "diskcache.Cache":
+    """Open an on-disk cache on first use, so importing the module creates no directories."""
+    import diskcache
+
+    return diskcache.Cache(directory)
 
 LEADS_PER_RUN = 10
 FB_GROUP = "general"  # Use a specific public group ID (e.g., "123456789") if known
+FB_PAGES = 3  # Upper bound on pages fetched; scraping stops earlier once enough leads match
+FB_POSTS_PER_PAGE = 20
+SCRAPE_CACHE_DIR = ".leadstorm_scrape_cache"  # (audience, group, day) -> raw leads
+
+DEFAULT_SCORE_MODEL = "gpt-4o-mini"  # Override with "score_model" in config.json
+BATCH_POLL_SECONDS = 30  # How often to check on a submitted Batch API job
+
+# OpenAI rate limits for the scoring model; match these to your account's tier
+MAX_REQUESTS_PER_MINUTE = 500
+MAX_TOKENS_PER_MINUTE = 200_000
+MAX_ATTEMPTS = 5  # Tries per request before giving up on 429/5xx/connection errors
+RETRY_INITIAL_SECONDS = 1.0  # Backoff when the API gives no Retry-After, doubling up to RETRY_MAX_SECONDS
+RETRY_MAX_SECONDS = 30.0
+LEADS_PER_PROMPT = 20  # Posts scored together in one chat completion
+SCORE_LINGER_SECONDS = 2.0  # Score a partial chunk once no new raw lead has arrived for this long
+SCORE_TOKENS_PER_LEAD = 12  # About nine tokens per {"id": n, "score": n} item, plus slack
+# Structured output: the model must answer with {"scores": [{"id": <post number>, "score": <0-10>}, ...]}
+SCORE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "scores",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "scores": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer"},
+                            "score": {"type": "integer", "minimum": 0, "maximum": 10}
+                        },
+                        "required": ["id", "score"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["scores"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# sha256(model + post) -> (score, model), plus one ScoreIndex entry per model for near-duplicate posts
+SCORE_CACHE_DIR = ".leadstorm_score_cache"
+SCORE_CACHE_SECONDS = 30 * 86400
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 256  # Shortened embeddings; plenty for spotting near-duplicates and 6x cheaper to compare
+SCORE_INDEX_MAX_ENTRIES = 500  # Most recent scored posts kept for the fuzzy lookup
+SCORE_SIMILARITY_CUTOFF = 0.95  # Cosine similarity needed to reuse a cached score
+
+HUNTER_URL = "https://api.hunter.io/v2/email-finder"
+UNKNOWN_NAME = "Unknown User"  # Placeholder for posts without an author name; never looked up
+HUNTER_CONCURRENCY = 20  # Parallel Hunter.io lookups
+
+# One keep-alive session for every Hunter.io call, so lookups reuse pooled TLS connections.
+# Hunter rate limits per minute, so back off on 429/5xx instead of pacing every call.
+HUNTER_SESSION = requests.Session()
+HUNTER_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=HUNTER_CONCURRENCY,
+    pool_maxsize=HUNTER_CONCURRENCY,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True  # Hunter sends Retry-After with its 429s
+    )
+))
+HUNTER_CACHE_DIR = ".leadstorm_hunter_cache"  # Normalized full name -> email
+HUNTER_CACHE_SECONDS = 30 * 86400
+
+SHEET_COLUMNS = ["name", "username", "email", "score", "why_fit", "post", "source"]
+SHEET_BATCH_ROWS = 50  # Rows written per Sheets API call
+SHEET_FLUSH_SECONDS = 2.0  # Write a partial batch once no new lead has arrived for this long
 
-def scrape_public_fb_leads(target_audience: str, progress_bar: ttk.Progressbar, root: tk.Tk) -> List[Dict]:
-    """Scrape public FB posts without login."""
+class PipelineProgress:
+    """Combines each stage's completed fraction into one progress bar value.
+
+    The pipeline runs off the Tk thread, so redraws are handed to Tk with root.after.
+    """
+    STAGE_RANGES = {"scrape": (10, 25), "qualify": (25, 50), "enrich": (50, 75), "upload": (75, 100)}
+
+    def __init__(self, progress_bar: ttk.Progressbar, root: tk.Tk):
+        self.progress_bar = progress_bar
+        self.root = root
+        self.fractions = {stage: 0.0 for stage in self.STAGE_RANGES}
+        self._redraw()
+
+    def update(self, stage: str, fraction: float):
+        # Stages run concurrently, so only ever move a stage forward
+        self.fractions[stage] = max(self.fractions[stage], min(fraction, 1.0))
+        self._redraw()
+
+    def _redraw(self):
+        value = 10 + sum(
+            (end - start) * self.fractions[stage] for stage, (start, end) in self.STAGE_RANGES.items()
+        )
+        self.root.after(0, lambda v=value: self.progress_bar.configure(value=v))
+
+async def scrape_public_fb_leads(target_audience: str, raw_q: asyncio.Queue, progress: PipelineProgress) -> int:
+    """Stream public FB posts matching the audience into raw_q, without login. Returns the lead count."""
+    leads = []
     try:
-        logging.info(f"Scraping public Facebook for '{target_audience}'...")
-        progress_bar['value'] = 10
-        root.update_idletasks()
-        posts = fb.get_posts(group=FB_GROUP, pages=5)  # No credentials, public data only
-        leads = []
-        for post in posts:
-            if post['text'] and target_audience.lower() in post['text'].lower():
-                leads.append({
+        logging.info("Scraping public Facebook for '%s'...", target_audience)
+        needle = target_audience.lower()
+        # Case-insensitive search without lowercasing a copy of every post
+        audience_pattern = re.compile(re.escape(target_audience), re.IGNORECASE)
+        cache_key = (needle, FB_GROUP, date.today().isoformat())
+        cached_leads = _cache(SCRAPE_CACHE_DIR).get(cache_key)
+        if cached_leads is not None:
+            logging.info("Using %d raw leads scraped from FB earlier today.", len(cached_leads))
+            leads = cached_leads
+            for lead in leads:
+                lead.setdefault('snippet', lead['post'][:50])  # Leads cached before snippets existed
+                await raw_q.put(lead)
+            return len(leads)
+        import facebook_scraper as fb
+
+        loop = asyncio.get_running_loop()
+        # No credentials, public data only. The generator fetches a page only when advanced past the previous one.
+        posts = fb.get_posts(group=FB_GROUP, pages=FB_PAGES, options={"posts_per_page": FB_POSTS_PER_PAGE})
+        while len(leads) < LEADS_PER_RUN * 2:
+            # Advancing the generator may fetch the next page, so do it off the event loop
+            post = await loop.run_in_executor(None, next, posts, None)
+            if post is None:
+                break
+            if post['text'] and audience_pattern.search(post['text']):
+                lead = {
                     "username": post['username'] or "unknown",
-                    "name": post.get('name', 'Unknown User'),
+                    "name": post.get('name', UNKNOWN_NAME),
                     "post": post['text'],
+                    "snippet": post['text'][:50],  # Sliced once here for why_fit and log lines downstream
                     "source": "Facebook"
-                })
-                logging.info(f"Found lead: {post['text'][:50]}...")
-            if len(leads) >= LEADS_PER_RUN * 2:
-                break
-        progress_bar['value'] = 25
-        root.update_idletasks()
-        logging.info(f"Scraped {len(leads)} raw leads from FB.")
-        return leads
+                }
+                leads.append(lead)
+                await raw_q.put(dict(lead))  # Downstream stages annotate their copy; the cache keeps the raw lead
+                logging.info("Found lead: %s...", lead['snippet'])
+                progress.update("scrape", len(leads) / (LEADS_PER_RUN * 2))
+        logging.info("Scraped %d raw leads from FB.", len(leads))
+        if leads:
+            _cache(SCRAPE_CACHE_DIR).set(cache_key, leads, expire=86400)
+        return len(leads)
+    except Exception as e:
+        logging.error("FB scrape failed: %s", e)
+        return len(leads)
+    finally:
+        progress.update("scrape", 1)
+        await raw_q.put(None)
+
+@dataclass
+class StatusTracker:
+    """Counters shared by the scoring dispatcher and its in-flight requests."""
+    num_tasks_in_progress: int = 0
+    num_tasks_succeeded: int = 0
+    num_tasks_failed: int = 0
+    num_rate_limit_errors: int = 0
+    num_api_errors: int = 0
+
+class RateLimiter:
+    """Request and token budgets that refill continuously, shared by every scoring request in a run."""
+
+    def __init__(self):
+        self.available_request_capacity = float(MAX_REQUESTS_PER_MINUTE)
+        self.available_token_capacity = float(MAX_TOKENS_PER_MINUTE)
+        self.last_update_time = time.monotonic()
+
+    def try_acquire(self, token_cost: int) -> bool:
+        """Spend one request and token_cost tokens if both budgets allow it."""
+        now = time.monotonic()
+        elapsed = now - self.last_update_time
+        self.available_request_capacity = min(
+            self.available_request_capacity + MAX_REQUESTS_PER_MINUTE * elapsed / 60, MAX_REQUESTS_PER_MINUTE
+        )
+        self.available_token_capacity = min(
+            self.available_token_capacity + MAX_TOKENS_PER_MINUTE * elapsed / 60, MAX_TOKENS_PER_MINUTE
+        )
+        self.last_update_time = now
+        if self.available_request_capacity >= 1 and self.available_token_capacity >= token_cost:
+            self.available_request_capacity -= 1
+            self.available_token_capacity -= token_cost
+            return True
+        return False
+
+    async def acquire(self, token_cost: int):
+        while not self.try_acquire(token_cost):
+            await asyncio.sleep(0.001)
+
+def _score_model() -> str:
+    return _cfg().get('score_model', DEFAULT_SCORE_MODEL)
+
+@functools.lru_cache(maxsize=1)
+def _score_encoding() -> Optional["tiktoken.Encoding"]:
+    """Tokenizer for the score model, or None if it can't be loaded (tiktoken downloads it on first use)."""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(_score_model())
+        except KeyError:
+            # Newer or fine-tuned models tiktoken doesn't know yet; close enough for rate-limit budgeting
+            return tiktoken.get_encoding("o200k_base")
     except Exception as e:
-        logging.error(f"FB scrape failed: {str(e)}")
-        return []
+        logging.warning("Could not load tiktoken encoding, estimating tokens from length instead: %s", e)
+        return None
+
+def _score_prompt(leads: List[Dict]) -> str:
+    posts = "\n".join(f"{number}) {lead['post']}" for number, lead in enumerate(leads, 1))
+    return (
+        "Score each post below (0-10) for fit as a potential customer. "
+        f"Return each post's number as its id together with its score.\nPosts:\n{posts}"
+    )
+
+def _score_request_body(leads: List[Dict]) -> Dict:
+    """Chat completion parameters for scoring a chunk of leads, shared by the real-time and Batch API paths."""
+    return {
+        "model": _score_model(),
+        "messages": [{"role": "user", "content": _score_prompt(leads)}],
+        "response_format": SCORE_RESPONSE_FORMAT,
+        "max_tokens": 10 + SCORE_TOKENS_PER_LEAD * len(leads)
+    }
+
+def _parse_scores(leads: List[Dict], content: str) -> List[Optional[int]]:
+    """Map the model's {"scores": [{"id", "score"}, ...]} answer back onto the chunk by post number."""
+    scores: List[Optional[int]] = [None] * len(leads)  # Posts the answer skips stay unscored
+    for item in json.loads(content)['scores']:
+        post_id, score = item['id'], item['score']
+        # The schema bounds both, but score_model may point at a model that doesn't enforce it
+        if type(post_id) is not int or type(score) is not int or not 0 <= score <= 10:
+            logging.warning("Discarding invalid score %r for post %r", score, post_id)
+            continue
+        position = post_id - 1
+        if 0 <= position < len(leads) and scores[position] is None:  # Ignore unknown and repeated ids
+            scores[position] = score
+            logging.info("OpenAI score for '%s...': %s", leads[position]['snippet'], score)
+    return scores
 
-def qualify_leads(leads: List[Dict], progress_bar: ttk.Progressbar, root: tk.Tk) -> List[Dict]:
-    """Qualify leads with OpenAI, with robust error handling."""
+def _chunk_starts(leads: List[Dict]) -> range:
+    """Start index of each LEADS_PER_PROMPT-sized chunk of leads."""
+    return range(0, len(leads), LEADS_PER_PROMPT)
+
+def _score_cache_key(lead: Dict) -> str:
+    return hashlib.sha256(f"{_score_model()}\n{lead['post']}".encode("utf-8")).hexdigest()
+
+async def _embed_posts(client: "AsyncOpenAI", leads: List[Dict]) -> Optional[List[List[float]]]:
+    """Unit-length embeddings of each lead's post, or None if the embeddings call fails."""
     try:
-        logging.info("Qualifying leads with OpenAI...")
-        client = OpenAI(api_key=OPENAI_KEY)
-        qualified = []
-        step_increment = 25 / max(1, len(leads))
-        current_progress = 25
-        for lead in leads:
-            prompt = f"Score this lead (0-10) for fit as a potential customer based on: Post: {lead['post']}"
+        response = await client.embeddings.create(
+            model=EMBEDDING_MODEL, input=[lead['post'] for lead in leads], dimensions=EMBEDDING_DIMENSIONS
+        )
+    except Exception as e:
+        logging.warning("Post embedding failed, skipping fuzzy score cache: %s", e)
+        return None
+    embeddings = []
+    for item in response.data:
+        norm = math.sqrt(sum(value * value for value in item.embedding)) or 1.0
+        embeddings.append([value / norm for value in item.embedding])
+    return embeddings
+
+class ScoreIndex:
+    """The most recent SCORE_INDEX_MAX_ENTRIES scores and embeddings for one model, for the fuzzy lookup.
+
+    Kept as a single score cache entry of packed float32 embeddings, so a run loads it with one read.
+    """
+
+    def __init__(self, model: str):
+        self.key = f"index:{model}"
+        self.entries: collections.deque = collections.deque(maxlen=SCORE_INDEX_MAX_ENTRIES)
+        self.changed = False
+        for score, packed in _cache(SCORE_CACHE_DIR).get(self.key) or []:
+            self.entries.append((score, array('f', packed)))
+
+    def add(self, score: int, embedding: List[float]):
+        self.entries.append((score, array('f', embedding)))
+        self.changed = True
+
+    def save(self):
+        if self.changed:
+            packed = [(score, embedding.tobytes()) for score, embedding in self.entries]
+            _cache(SCORE_CACHE_DIR).set(self.key, packed, expire=SCORE_CACHE_SECONDS)
+
+    def most_similar(self, embeddings: List[List[float]]) -> List[Optional[int]]:
+        """Score of the most similar cached post for each embedding, if it clears SCORE_SIMILARITY_CUTOFF."""
+        entries = list(self.entries)  # Snapshot; the event loop may add entries meanwhile
+        matches: List[Optional[int]] = []
+        for embedding in embeddings:
+            best_score, best_similarity = None, SCORE_SIMILARITY_CUTOFF
+            for score, cached in entries:
+                similarity = sum(map(operator.mul, embedding, cached))  # Both unit length, so this is the cosine
+                if similarity >= best_similarity:
+                    best_score, best_similarity = score, similarity
+            matches.append(best_score)
+        return matches
+
+async def _score_with_cache(
+    client: "AsyncOpenAI",
+    index: ScoreIndex,
+    leads: List[Dict],
+    score_fn: Callable[[List[Dict]], Awaitable[List[Optional[int]]]]
+) -> List[Optional[int]]:
+    """Reuse cached scores for exact and near-duplicate posts and call score_fn for the rest."""
+    model = _score_model()
+    keys = [_score_cache_key(lead) for lead in leads]
+    scores: List[Optional[int]] = [None] * len(leads)
+    for position, key in enumerate(keys):
+        entry = _cache(SCORE_CACHE_DIR).get(key)
+        if entry is not None:
+            scores[position] = entry[0]
+    pending = [position for position, score in enumerate(scores) if score is None]
+    if not pending:
+        logging.info("All %d scores served from cache.", len(leads))
+        return scores
+
+    embeddings = await _embed_posts(client, [leads[position] for position in pending])
+    if embeddings is not None:
+        # The scan is bounded by SCORE_INDEX_MAX_ENTRIES; running it in the executor keeps the loop responsive
+        matches = await asyncio.get_running_loop().run_in_executor(None, index.most_similar, embeddings)
+        for position, match in zip(pending, matches):
+            scores[position] = match
+    to_score = [position for position in pending if scores[position] is None]
+    logging.info("%d of %d scores served from cache.", len(leads) - len(to_score), len(leads))
+    if not to_score:
+        return scores
+
+    fresh_scores = await score_fn([leads[position] for position in to_score])
+    for position, score in zip(to_score, fresh_scores):
+        scores[position] = score
+        if score is not None:
+            _cache(SCORE_CACHE_DIR).set(keys[position], (score, model), expire=SCORE_CACHE_SECONDS)
+            if embeddings is not None:
+                index.add(score, embeddings[pending.index(position)])
+    return scores
+
+def _estimate_tokens(text: str) -> int:
+    """Prompt token count for rate-limit budgeting."""
+    encoding = _score_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1  # Roughly four characters per token for English text
+    return len(encoding.encode(text))
+
+_retry_backoff = wait_exponential_jitter(initial=RETRY_INITIAL_SECONDS, max=RETRY_MAX_SECONDS)
+
+def _retry_wait(retry_state: RetryCallState) -> float:
+    """Wait as long as the API's Retry-After header asks, else back off exponentially with jitter."""
+    response = getattr(retry_state.outcome.exception(), 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(retry_after), RETRY_MAX_SECONDS)
+    except (TypeError, ValueError):
+        return _retry_backoff(retry_state)
+
+async def _score_chunk(client: "AsyncOpenAI", leads: List[Dict]) -> List[Optional[int]]:
+    """Score a chunk of leads with one chat completion."""
+    # Retries are ours (see _score_leads_async), so turn off the SDK's own for this call only
+    response = await client.with_options(max_retries=0).chat.completions.create(**_score_request_body(leads))
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        raise ValueError("answer was cut off at max_tokens")
+    return _parse_scores(leads, choice.message.content)
+
+async def _score_leads_async(client: "AsyncOpenAI", limiter: RateLimiter, leads: List[Dict]) -> List[Optional[int]]:
+    """Score leads as fast as the request/token rate limits allow.
+
+    Follows the openai-cookbook api_request_parallel_processor pattern: a request is
+    dispatched as soon as the shared RateLimiter has capacity for it. Requests only wait
+    when the API pushes back: 429/5xx/connection failures are retried, honouring
+    Retry-After. Each request scores a chunk of up to LEADS_PER_PROMPT leads.
+    """
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+
+    retryable_errors = (RateLimitError, APIConnectionError, InternalServerError)
+    queue: asyncio.Queue = asyncio.Queue()
+    for chunk_start in _chunk_starts(leads):
+        queue.put_nowait(chunk_start)
+    scores: List[Optional[int]] = [None] * len(leads)  # Leads whose chunk fails every attempt stay unscored
+    status = StatusTracker()
+    tasks = set()
+
+    def finish(succeeded: bool):
+        status.num_tasks_in_progress -= 1
+        if succeeded:
+            status.num_tasks_succeeded += 1
+        else:
+            status.num_tasks_failed += 1
+
+    async def score_request(chunk_start: int, token_cost: int):
+        chunk = leads[chunk_start:chunk_start + LEADS_PER_PROMPT]
+        label = f"leads {chunk_start + 1}-{chunk_start + len(chunk)}"
+
+        def before_sleep(retry_state: RetryCallState):
+            error = retry_state.outcome.exception()
+            if isinstance(error, RateLimitError):
+                status.num_rate_limit_errors += 1
+            else:
+                status.num_api_errors += 1
+            logging.warning("OpenAI call for %s failed (%s), retrying in %.1fs", label, error, retry_state.next_action.sleep)
+
+        try:
+            async for attempt in AsyncRetrying(
+                retry=retry_if_exception_type(retryable_errors),
+                wait=_retry_wait,
+                stop=stop_after_attempt(MAX_ATTEMPTS),
+                before_sleep=before_sleep,
+                reraise=True
+            ):
+                with attempt:
+                    if attempt.retry_state.attempt_number > 1:
+                        await limiter.acquire(token_cost)  # Retries spend rate-limit budget like first attempts
+                    scores[chunk_start:chunk_start + len(chunk)] = await _score_chunk(client, chunk)
+        except retryable_errors as e:
+            logging.error("OpenAI call failed for %s after %d attempts: %s", label, MAX_ATTEMPTS, e)
+            finish(False)
+            return
+        except Exception as e:
+            logging.error("OpenAI call failed for %s: %s", label, e)
+            finish(False)
+            return
+        finish(True)
+
+    next_request: Optional[int] = None
+    token_cost = 0
+    while True:
+        if next_request is None and not queue.empty():
+            next_request = queue.get_nowait()
+            status.num_tasks_in_progress += 1
+            request_body = _score_request_body(leads[next_request:next_request + LEADS_PER_PROMPT])
+            token_cost = _estimate_tokens(request_body['messages'][0]['content']) + request_body['max_tokens']
+
+        if next_request is not None and limiter.try_acquire(token_cost):
+            task = asyncio.create_task(score_request(next_request, token_cost))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_request = None
+            continue
+
+        if next_request is None and queue.empty() and status.num_tasks_in_progress == 0:
+            break
+        await asyncio.sleep(0.001)
+
+    logging.info(
+        "Scoring finished: %d succeeded, %d failed, %d rate limit errors, %d API errors.",
+        status.num_tasks_succeeded, status.num_tasks_failed, status.num_rate_limit_errors, status.num_api_errors
+    )
+    return scores
+
+async def _score_leads_batch(
+    client: "AsyncOpenAI",
+    leads: List[Dict],
+    report: Callable[[float], None]
+) -> List[Optional[int]]:
+    """Score leads with one OpenAI Batch API job (half the cost, results within 24h), polling until it finishes."""
+    logging.info("Submitting leads to the OpenAI Batch API...")
+    batch_lines = [
+        json.dumps({
+            "custom_id": str(chunk_start),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _score_request_body(leads[chunk_start:chunk_start + LEADS_PER_PROMPT])
+        })
+        for chunk_start in _chunk_starts(leads)
+    ]
+    batch_file = await client.files.create(
+        file=("leadstorm_batch.jsonl", "\n".join(batch_lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    logging.info("Submitted batch %s with %d leads.", batch.id, len(leads))
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        counts = batch.request_counts
+        if counts and counts.total:
+            report(counts.completed / counts.total)
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+        batch = await client.batches.retrieve(batch.id)
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+    scores: List[Optional[int]] = [None] * len(leads)  # Requests missing from the output stay unscored
+    if batch.output_file_id:
+        output = await client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            # A bad line only loses its own chunk, not the rest of a job we already waited on
             try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=10
-                )
-                raw_score = response.choices[0].message.content.strip()
-                logging.info(f"Raw OpenAI score for '{lead['post'][:50]}...': {raw_score}")
-                score = int(raw_score) if raw_score.isdigit() else 0  # Fallback to 0 if not a number
-            except Exception as e:
-                logging.error(f"OpenAI call failed for lead '{lead['post'][:50]}...': {str(e)}")
-                score = 0  # Fallback score on error
-            if score >= 5:
+                result = json.loads(line)
+                chunk_start = int(result['custom_id'])
+                chunk = leads[chunk_start:chunk_start + LEADS_PER_PROMPT]
+                response = result.get('response') or {}
+                if response.get('status_code') != 200:
+                    logging.error("OpenAI batch request failed for leads %d-%d: %s", chunk_start + 1, chunk_start + len(chunk), result.get('error'))
+                    continue
+                choice = response['body']['choices'][0]
+                if choice.get('finish_reason') == "length":
+                    logging.error("OpenAI batch answer for leads %d-%d was cut off at max_tokens", chunk_start + 1, chunk_start + len(chunk))
+                    continue
+                scores[chunk_start:chunk_start + len(chunk)] = _parse_scores(chunk, choice['message']['content'])
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                logging.error("Could not parse OpenAI batch output line %.100r: %s", line, e)
+    return scores
+
+async def _lead_chunks(queue: asyncio.Queue, chunk_size: int, linger_seconds: float) -> AsyncIterator[List[Dict]]:
+    """Group leads from queue into chunks of chunk_size until its None sentinel.
+
+    A partial chunk is released once the queue has been quiet for linger_seconds, so the
+    next stage starts while the previous one is still producing.
+    """
+    chunk: List[Dict] = []
+    next_lead = asyncio.ensure_future(queue.get())
+    while True:
+        done, _ = await asyncio.wait({next_lead}, timeout=linger_seconds if chunk else None)
+        if not done:
+            yield chunk
+            chunk = []
+            continue
+        lead = next_lead.result()
+        if lead is None:
+            break
+        chunk.append(lead)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+        next_lead = asyncio.ensure_future(queue.get())
+    if chunk:
+        yield chunk
+
+async def qualify_leads(raw_q: asyncio.Queue, qualified_q: asyncio.Queue, use_batch: bool, progress: PipelineProgress):
+    """Score leads from raw_q with OpenAI and pass those scoring 5+ on to qualified_q, up to LEADS_PER_RUN."""
+    qualified_count = 0
+    scored_count = 0
+
+    async def forward(leads: List[Dict], scores: List[Optional[int]]):
+        nonlocal qualified_count, scored_count
+        for lead, score in zip(leads, scores):
+            if score is not None and score >= 5 and qualified_count < LEADS_PER_RUN:  # Unscored leads count as 0
                 lead['score'] = score
-                qualified.append(lead)
-            current_progress += step_increment
-            progress_bar['value'] = min(current_progress, 50)
-            root.update_idletasks()
-            time.sleep(1)
-            if len(qualified) >= LEADS_PER_RUN:
-                break
-        progress_bar['value'] = 50
-        root.update_idletasks()
-        logging.info(f"Qualified {len(qualified)} leads.")
-        return qualified
+                qualified_count += 1
+                await qualified_q.put(lead)
+        scored_count += len(leads)
+        progress.update("qualify", scored_count / (LEADS_PER_RUN * 2))
+
+    try:
+        logging.info("Qualifying leads with OpenAI...")
+        from openai import AsyncOpenAI
+
+        loop = asyncio.get_running_loop()
+        index = await loop.run_in_executor(None, ScoreIndex, _score_model())
+        # One client for the whole run so its connection pool is reused across calls
+        async with AsyncOpenAI(api_key=_cfg()['openai_key']) as client:
+            if use_batch:
+                # A batch job is all-or-nothing, so wait for the full scrape before submitting
+                leads = []
+                while (lead := await raw_q.get()) is not None:
+                    leads.append(lead)
+                if leads:
+                    report = lambda fraction: progress.update("qualify", fraction)
+                    scores = await _score_with_cache(client, index, leads, lambda pending: _score_leads_batch(client, pending, report))
+                    await forward(leads, scores)
+            else:
+                limiter = RateLimiter()
+                await loop.run_in_executor(None, _score_encoding)  # Load the tokenizer, which may download, off the loop
+
+                async def score_and_forward(chunk: List[Dict]):
+                    # A failing chunk only loses its own leads; the sentinel must wait for the other chunks
+                    try:
+                        scores = await _score_with_cache(client, index, chunk, lambda pending: _score_leads_async(client, limiter, pending))
+                    except Exception as e:
+                        logging.error("Scoring failed for a chunk of %d leads: %s", len(chunk), e)
+                        scores = [None] * len(chunk)
+                    await forward(chunk, scores)
+
+                tasks = [asyncio.ensure_future(score_and_forward(chunk)) async for chunk in _lead_chunks(raw_q, LEADS_PER_PROMPT, SCORE_LINGER_SECONDS)]
+                await asyncio.gather(*tasks)
+        await loop.run_in_executor(None, index.save)
+        logging.info("Qualified %d leads.", qualified_count)
     except Exception as e:
-        logging.error(f"OpenAI qualification failed entirely: {str(e)}")
-        return []
+        logging.error("OpenAI qualification failed entirely: %s", e)
+    finally:
+        progress.update("qualify", 1)
+        await qualified_q.put(None)
 
-def enrich_leads(leads: List[Dict], progress_bar: ttk.Progressbar, root: tk.Tk) -> List[Dict]:
-    """Enrich leads with email addresses using Hunter.io."""
+def _enrich_one(lead: Dict) -> Dict:
+    """Look up one lead's email on Hunter.io."""
+    lead['why_fit'] = f"Post: {lead['snippet']}..."
+    lead['email'] = 'N/A'
+    try:
+        name = (lead['name'] or "").strip()
+        if not name or name == UNKNOWN_NAME:
+            return lead  # Nothing to look up, and placeholder names must not share a cache entry
+        cache_key = name.lower()
+        cached_email = _cache(HUNTER_CACHE_DIR).get(cache_key)
+        if cached_email is not None:
+            lead['email'] = cached_email
+            return lead
+        # The key goes in a header, not the query string, so it never shows up in logged error URLs
+        response = HUNTER_SESSION.get(HUNTER_URL, params={"full_name": name}, headers={"X-API-KEY": _cfg()['hunter_key']}, timeout=5)
+        response.raise_for_status()  # A bad key or spent quota must not be cached as "no email"
+        data = response.json().get('data')
+        if data is None:
+            raise ValueError("Hunter.io reply has no data")
+        lead['email'] = data.get('email') or 'N/A'
+        _cache(HUNTER_CACHE_DIR).set(cache_key, lead['email'], expire=HUNTER_CACHE_SECONDS)
+    except Exception as e:
+        logging.error("Hunter.io lookup failed for '%s': %s", lead['name'], e)
+        lead['email'] = 'N/A'
+    return lead
+
+async def enrich_leads(qualified_q: asyncio.Queue, enriched_q: asyncio.Queue, progress: PipelineProgress):
+    """Look up emails on Hunter.io for leads from qualified_q as they arrive and pass them on to enriched_q."""
+    loop = asyncio.get_running_loop()
+    enriched_count = 0
     try:
         logging.info("Enriching leads with Hunter.io...")
-        step_increment = 25 / max(1, len(leads))
-        current_progress = 50
-        for lead in leads:
-            url = f"https://api.hunter.io/v2/email-finder?full_name={lead['name']}&api_key={HUNTER_KEY}"
-            response = requests.get(url, timeout=5).json()
-            lead['email'] = response.get('data', {}).get('email', 'N/A')
-            lead['why_fit'] = f"Post: {lead['post'][:50]}..."
-            current_progress += step_increment
-            progress_bar['value'] = min(current_progress, 75)
-            root.update_idletasks()
-            time.sleep(1)
-        progress_bar['value'] = 75
-        root.update_idletasks()
-        logging.info(f"Enriched {len(leads)} leads.")
-        return leads
+        with ThreadPoolExecutor(max_workers=HUNTER_CONCURRENCY) as executor:
+            async def enrich(lead: Dict):
+                nonlocal enriched_count
+                await enriched_q.put(await loop.run_in_executor(executor, _enrich_one, lead))
+                enriched_count += 1
+                progress.update("enrich", enriched_count / LEADS_PER_RUN)
+
+            tasks = []
+            while (lead := await qualified_q.get()) is not None:
+                tasks.append(asyncio.ensure_future(enrich(lead)))
+            await asyncio.gather(*tasks)
+        logging.info("Enriched %d leads.", enriched_count)
     except Exception as e:
-        logging.error(f"Hunter.io enrichment failed: {str(e)}")
-        return leads
+        logging.error("Hunter.io enrichment failed: %s", e)
+    finally:
+        progress.update("enrich", 1)
+        await enriched_q.put(None)
+
+def _sheet_cell(value) -> Dict:
+    """Cell data for spreadsheets.create; typed values are stored as-is, like valueInputOption=RAW."""
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+def _sheet_row(lead: Dict) -> List:
+    return [lead.get(column, "") for column in SHEET_COLUMNS]
+
+def _sheet_services() -> Tuple:
+    """Sheets and Drive API clients plus the credentials they share, so one token fetch."""
+    from google.oauth2.service_account import Credentials
+    from googleapiclient.discovery import build
+
+    scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+    creds = Credentials.from_service_account_info(_cfg()['google_creds'], scopes=scope)
+    sheets_service = build("sheets", "v4", credentials=creds, cache_discovery=False)
+    drive_service = build("drive", "v3", credentials=creds, cache_discovery=False)
+    return creds, sheets_service, drive_service
+
+_google_http = threading.local()  # One authorized keep-alive connection per executor thread
+
+def _execute(request, creds):
+    """Execute a Google API request on this thread's own connection; httplib2 is not thread-safe."""
+    import google_auth_httplib2
+    import httplib2
+
+    http = getattr(_google_http, 'http', None)
+    if http is None or http.credentials is not creds:
+        http = _google_http.http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    return request.execute(http=http)
+
+def _create_sheet(creds, sheets_service, rows: List[List]) -> str:
+    """Create a Google Sheet holding the header and first rows in one Sheets API call, and return its ID."""
+    sheet_name = f"LeadStorm_{int(time.time())}"
+    spreadsheet = _execute(sheets_service.spreadsheets().create(
+        body={
+            "properties": {"title": sheet_name},
+            "sheets": [{"data": [{
+                "startRow": 0,
+                "startColumn": 0,
+                "rowData": [{"values": [_sheet_cell(value) for value in row]} for row in [SHEET_COLUMNS] + rows]
+            }]}]
+        },
+        fields="spreadsheetId"
+    ), creds)
+    logging.info("Created sheet %s", sheet_name)
+    return spreadsheet['spreadsheetId']
+
+def _share_sheet(creds, drive_service, spreadsheet_id: str):
+    _execute(drive_service.permissions().create(
+        fileId=spreadsheet_id,
+        body={"type": "anyone", "role": "writer"},
+        fields="id"
+    ), creds)
+
+def _append_rows(creds, sheets_service, spreadsheet_id: str, rows: List[List]):
+    _execute(sheets_service.spreadsheets().values().append(
+        spreadsheetId=spreadsheet_id,
+        range="A1",
+        valueInputOption="RAW",
+        insertDataOption="INSERT_ROWS",
+        body={"values": rows}
+    ), creds)
+
+async def upload_to_sheets(enriched_q: asyncio.Queue, progress: PipelineProgress) -> Tuple[List[Dict], Optional[str]]:
+    """Stream enriched leads into a Google Sheet in batches. Returns the leads and the sheet URL, if any.
+
+    The sheet is created with the header and the first batch, so runs without leads leave
+    no empty sheet behind. Sharing then overlaps with the later appends, which run one after
+    another on the default executor so rows land in order.
+    """
+    loop = asyncio.get_running_loop()
+    leads: List[Dict] = []
+    written_count = 0
+    share: Optional[asyncio.Future] = None
+    last_append: Optional[asyncio.Future] = None
+    spreadsheet_id = None
+
+    def written(row_count: int):
+        nonlocal written_count
+        written_count += row_count
+        progress.update("upload", written_count / LEADS_PER_RUN)
+
+    async def append(rows: List[List], previous: Optional[asyncio.Future]):
+        if previous is not None:
+            await previous
+        await loop.run_in_executor(None, _append_rows, creds, sheets_service, spreadsheet_id, rows)
+        written(len(rows))
 
-def upload_to_sheets(leads: List[Dict], progress_bar: ttk.Progressbar, root: tk.Tk) -> str:
-    """Upload leads to a Google Sheet and return its URL."""
     try:
-        logging.info("Uploading leads to Google Sheets...")
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keydict(GOOGLE_CREDS, scope)
-        client = gspread.authorize(creds)
-        sheet_name = f"LeadStorm_{int(time.time())}"
-        sheet = client.create(sheet_name).sheet1
-        sheet.spreadsheet.share(None, perm_type='anyone', role='writer')
-        
-        df = pd.DataFrame(leads)
-        if df.empty:
-            df = pd.DataFrame([{"name": "No leads found", "email": "N/A", "why_fit": "Try a different audience"}])
-        sheet.update([df.columns.values.tolist()] + df.values.tolist())
-        progress_bar['value'] = 100
-        root.update_idletasks()
-        logging.info(f"Leads uploaded to {sheet_name}")
-        return f"https://docs.google.com/spreadsheets/d/{sheet.spreadsheet.id}"
+        async for batch in _lead_chunks(enriched_q, SHEET_BATCH_ROWS, SHEET_FLUSH_SECONDS):
+            rows = [_sheet_row(lead) for lead in batch]
+            leads.extend(batch)
+            if spreadsheet_id is None:
+                logging.info("Uploading leads to Google Sheets...")
+                creds, sheets_service, drive_service = await loop.run_in_executor(None, _sheet_services)
+                spreadsheet_id = await loop.run_in_executor(None, _create_sheet, creds, sheets_service, rows)
+                written(len(rows))
+                share = asyncio.ensure_future(loop.run_in_executor(None, _share_sheet, creds, drive_service, spreadsheet_id))
+            else:
+                last_append = asyncio.ensure_future(append(rows, last_append))
+        await asyncio.gather(*(write for write in (share, last_append) if write is not None))
     except Exception as e:
-        logging.error(f"Google Sheets upload failed: {str(e)}")
+        logging.error("Google Sheets upload failed: %s", e)
         raise
+    if spreadsheet_id is None:
+        return leads, None
+    progress.update("upload", 1)
+    logging.info("Uploaded %d leads.", len(leads))
+    return leads, f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}"
+
+async def run_pipeline(
+    target_audience: str,
+    use_batch: bool,
+    progress: PipelineProgress
+) -> Tuple[int, List[Dict], Optional[str]]:
+    """Run scrape -> qualify -> enrich -> upload concurrently, with leads flowing between stages through queues.
+
+    Returns the number of raw leads scraped, the enriched leads, and the sheet URL.
+    """
+    raw_q: asyncio.Queue = asyncio.Queue()
+    qualified_q: asyncio.Queue = asyncio.Queue()
+    enriched_q: asyncio.Queue = asyncio.Queue()
+    raw_count, _, _, (leads, sheet_url) = await asyncio.gather(
+        scrape_public_fb_leads(target_audience, raw_q, progress),
+        qualify_leads(raw_q, qualified_q, use_batch, progress),
+        enrich_leads(qualified_q, enriched_q, progress),
+        upload_to_sheets(enriched_q, progress)
+    )
+    return raw_count, leads, sheet_url
 
 def run_leadstorm():
     """Main function with a loading bar."""
     root = tk.Tk()
     root.title("LeadStorm")
-    root.geometry("300x150")
+    root.geometry("300x180")
     root.resizable(False, False)
 
     tk.Label(root, text="Who do you sell to? (e.g., 'small business owners')").pack(pady=10)
     audience_entry = tk.Entry(root, width=30)
     audience_entry.pack(pady=5)
 
+    use_batch = tk.BooleanVar(value=False)
+    tk.Checkbutton(root, text="Use Batch API (half price, up to 24h)", variable=use_batch).pack()
+
     progress_bar = ttk.Progressbar(root, maximum=100, length=250, mode='determinate')
     progress_bar.pack(pady=10)
 
@@ -163,25 +852,45 @@ def run_leadstorm():
         if not audience:
             messagebox.showerror("LeadStorm", "Enter an audience first!")
             return
-        
-        logging.info(f"Starting LeadStorm for audience: {audience}")
+
+        try:
+            _cfg()  # Surface a missing or incomplete config.json before any work starts
+        except (OSError, ValueError, KeyError):
+            messagebox.showerror("LeadStorm", "config.json is missing or incomplete. Add your API keys and try again.")
+            return
+
+        logging.info("Starting LeadStorm for audience: %s", audience)
         start_button.config(state="disabled")
-        
-        raw_leads = scrape_public_fb_leads(audience, progress_bar, root)
-        if not raw_leads:
+
+        # Run the pipeline on a worker thread so the Tk event loop keeps pumping
+        progress = PipelineProgress(progress_bar, root)
+        worker = threading.Thread(target=run_in_background, args=(audience, use_batch.get(), progress), daemon=True)
+        worker.start()
+
+    def run_in_background(audience: str, use_batch_api: bool, progress: PipelineProgress):
+        try:
+            result = asyncio.run(run_pipeline(audience, use_batch_api, progress))
+        except Exception as e:
+            logging.error("LeadStorm pipeline failed: %s", e)
+            root.after(0, show_failure)
+            return
+        root.after(0, lambda: show_result(*result))
+
+    def show_failure():
+        messagebox.showerror("LeadStorm", "Something went wrong. Check your setup and try again.")
+        root.destroy()
+
+    def show_result(raw_count: int, enriched_leads: List[Dict], sheet_url: Optional[str]):
+        if not raw_count:
             messagebox.showwarning("LeadStorm", "No leads found on public FB. Try a different audience.")
             root.destroy()
             return
-        
-        qualified_leads = qualify_leads(raw_leads, progress_bar, root)
-        if not qualified_leads:
+
+        if not enriched_leads:
             messagebox.showwarning("LeadStorm", "No leads scored high enough. Try a broader audience.")
             root.destroy()
             return
-        
-        enriched_leads = enrich_leads(qualified_leads, progress_bar, root)
-        sheet_url = upload_to_sheets(enriched_leads, progress_bar, root)
-        
+
         messagebox.showinfo("LeadStorm", f"Done! Found {len(enriched_leads)} leads: {sheet_url}")
         webbrowser.open(sheet_url)
         root.destroy()
@@ -195,5 +904,5 @@ if __name__ == "__main__":
     try:
         run_leadstorm()
     except Exception as e:
-        logging.error(f"LeadStorm crashed: {str(e)}")
-        messagebox.showerror("LeadStorm", "Something went wrong. Check your setup and try again.")
\ No newline at end of file
+        logging.error("LeadStorm crashed: %s", e)
+        messagebox.showerror("LeadStorm", "Something went wrong. Check your setup and try again.")